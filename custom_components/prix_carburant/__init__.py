@@ -1,41 +1,79 @@
 """Prix Carburant integration."""
 
-from datetime import timedelta
+from datetime import datetime, timedelta
 import logging
 
-from homeassistant.config_entries import ConfigEntry
+import voluptuous as vol
+
+from homeassistant.components.sensor import DOMAIN as SENSOR_DOMAIN
+from homeassistant.config_entries import ConfigEntry, ConfigEntryState
 from homeassistant.const import (
     ATTR_LATITUDE,
     ATTR_LONGITUDE,
     ATTR_NAME,
     CONF_SCAN_INTERVAL,
+    EVENT_HOMEASSISTANT_CLOSE,
 )
 from homeassistant.core import (
+    Event,
     HomeAssistant,
     ServiceCall,
     ServiceResponse,
     SupportsResponse,
+    callback,
 )
 from homeassistant.exceptions import HomeAssistantError
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers import device_registry as dr, entity_registry as er
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 
 from .const import (
     ATTR_ADDRESS,
     ATTR_CITY,
+    ATTR_DISTANCE,
+    ATTR_EFFECTIVE_COST,
+    ATTR_FUELS,
     ATTR_POSTAL_CODE,
     ATTR_PRICE,
     CONF_DISPLAY_ENTITY_PICTURES,
+    CONF_FUELS,
     CONF_MAX_KM,
+    CONF_PRICE_CHANGE_THRESHOLD,
     CONF_STATIONS,
+    CONF_TRACKERS,
+    DEFAULT_CONSUMPTION,
+    DEFAULT_DISCOVERY_INTERVAL,
+    DEFAULT_PRICE_CHANGE_THRESHOLD,
     DEFAULT_SCAN_INTERVAL,
+    DEFAULT_TANK_SIZE,
     DOMAIN,
+    EVENT_PRICES_CHANGED,
     PLATFORMS,
+    RANKING_EFFECTIVE_COST,
+    RANKING_PRICE,
+    SIGNAL_UPDATE_ENTITIES,
+)
+from .history import PrixCarburantHistory
+from .profiler import async_profile_refreshes
+from .tiles import PrixCarburantTileCache
+from .tools import (
+    PrixCarburantTool,
+    PrixCarburantToolCannotConnectError,
+    PrixCarburantToolRequestError,
+    get_enabled_fuels,
 )
-from .tools import PrixCarburantTool
 
 _LOGGER = logging.getLogger(__name__)
 
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional("count", default=1): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=10)
+        ),
+    }
+)
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up from a config entry."""
@@ -43,14 +81,33 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     config: dict = entry.data | entry.options
 
-    websession = async_get_clientsession(hass)
-
     tool = await hass.async_add_executor_job(
-        PrixCarburantTool, hass.config.time_zone, 60, websession
+        PrixCarburantTool, hass.config.time_zone, 60
+    )
+    entry.async_on_unload(tool.close)
+
+    async def async_close_tool(_: Event) -> None:
+        """Close the tool, config entries are not unloaded at stop."""
+        await tool.close()
+
+    entry.async_on_unload(
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, async_close_tool)
     )
 
+    tool.fuels = get_enabled_fuels(config)
     display_entity_pictures = config.get(CONF_DISPLAY_ENTITY_PICTURES, True)
     update_interval = int(config.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL))
+    options = {
+        CONF_DISPLAY_ENTITY_PICTURES: display_entity_pictures,
+        CONF_FUELS: get_enabled_fuels(config),
+        CONF_MAX_KM: config.get(CONF_MAX_KM),
+        CONF_PRICE_CHANGE_THRESHOLD: float(
+            config.get(CONF_PRICE_CHANGE_THRESHOLD, DEFAULT_PRICE_CHANGE_THRESHOLD)
+        ),
+        CONF_STATIONS: config.get(CONF_STATIONS),
+        CONF_SCAN_INTERVAL: update_interval,
+        CONF_TRACKERS: config.get(CONF_TRACKERS, []),
+    }
 
     # yaml configuration
     if CONF_STATIONS in config:
@@ -70,10 +127,95 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         )
         _LOGGER.info("%s stations found", str(len(tool.stations)))
 
+    history = PrixCarburantHistory(hass, entry.entry_id, update_interval)
+    await history.async_load()
+
+    # station fuels of the entry sensors, from the entity registry
+    entity_registry = er.async_get(hass)
+    sensors: dict[str, tuple[str, str]] = {}
+    # station fuels whose sensor is disabled, their prices are not requested
+    disabled_sensors: set[tuple[str, str]] = set()
+
+    @callback
+    def async_update_sensor(entity_id: str) -> None:
+        """Update disabled state of the station fuel of a sensor."""
+        if (key := sensors.pop(entity_id, None)) is not None:
+            disabled_sensors.discard(key)
+        registry_entry = entity_registry.async_get(entity_id)
+        if (
+            registry_entry is not None
+            and registry_entry.config_entry_id == entry.entry_id
+            and registry_entry.domain == SENSOR_DOMAIN
+        ):
+            station_id, fuel = registry_entry.unique_id.removeprefix(
+                f"{DOMAIN}_"
+            ).rsplit("_", 1)
+            sensors[entity_id] = (station_id, fuel)
+            if registry_entry.disabled_by:
+                disabled_sensors.add((station_id, fuel))
+
+    @callback
+    def async_filter_registry_event(
+        event_data: er.EventEntityRegistryUpdatedData,
+    ) -> bool:
+        """Filter registry events which may change sensors of the entry."""
+        if event_data["action"] == "update" and not (
+            "disabled_by" in event_data["changes"] or "old_entity_id" in event_data
+        ):
+            return False
+        if event_data["entity_id"] in sensors:
+            return True
+        registry_entry = entity_registry.async_get(event_data["entity_id"])
+        return (
+            registry_entry is not None
+            and registry_entry.config_entry_id == entry.entry_id
+        )
+
+    @callback
+    def async_registry_updated(event: Event) -> None:
+        """Update disabled state of the station fuel of a registry event."""
+        async_update_sensor(event.data["entity_id"])
+        if old_entity_id := event.data.get("old_entity_id"):
+            async_update_sensor(old_entity_id)
+
+    for registry_entry in er.async_entries_for_config_entry(
+        entity_registry, entry.entry_id
+    ):
+        async_update_sensor(registry_entry.entity_id)
+    entry.async_on_unload(
+        hass.bus.async_listen(
+            er.EVENT_ENTITY_REGISTRY_UPDATED,
+            async_registry_updated,
+            event_filter=async_filter_registry_event,
+        )
+    )
+
     async def async_update_data():
         """Fetch data from API."""
-        _LOGGER.info("Update stations prices")
-        await tool.update_stations_prices()
+        # fuels without sensor yet are requested, the station may sell them now
+        stations_fuels = {
+            station_id: [
+                fuel
+                for fuel in tool.fuels
+                if (str(station_id), fuel) not in disabled_sensors
+            ]
+            for station_id in tool.stations
+        }
+        _LOGGER.info(
+            "Update stations prices (%s station fuels with disabled sensors skipped)",
+            len(disabled_sensors),
+        )
+        old_prices = _get_prices(tool.stations)
+        await tool.update_stations_prices(stations_fuels)
+        history.async_record(tool.stations)
+        if changes := _get_prices_changes(
+            old_prices, tool.stations, options[CONF_PRICE_CHANGE_THRESHOLD]
+        ):
+            _LOGGER.debug("%s prices changed", len(changes))
+            hass.bus.async_fire(
+                EVENT_PRICES_CHANGED,
+                {"entry_id": entry.entry_id, "changes": changes},
+            )
         return tool.stations
 
     coordinator = DataUpdateCoordinator(
@@ -86,20 +228,48 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     await coordinator.async_config_entry_first_refresh()
 
+    tiles = PrixCarburantTileCache(hass, entry, tool)
+    tiles.async_set_trackers(options[CONF_TRACKERS])
+    entry.async_on_unload(lambda: tiles.async_set_trackers([]))
+
     hass.data[DOMAIN][entry.entry_id] = {
         "tool": tool,
         "coordinator": coordinator,
-        "options": {
-            CONF_DISPLAY_ENTITY_PICTURES: display_entity_pictures,
-        },
+        "history": history,
+        "tiles": tiles,
+        "options": options,
     }
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
+
+    if CONF_STATIONS not in config:
+
+        async def async_rediscover_stations(_: datetime) -> None:
+            """Rediscover stations within range."""
+            try:
+                await _async_update_stations_list(hass, entry)
+            except (
+                PrixCarburantToolCannotConnectError,
+                PrixCarburantToolRequestError,
+            ) as err:
+                _LOGGER.warning("Cannot rediscover stations: %s", err)
+
+        entry.async_on_unload(
+            async_track_time_interval(
+                hass,
+                async_rediscover_stations,
+                timedelta(hours=DEFAULT_DISCOVERY_INTERVAL),
+                name=f"{DOMAIN} stations discovery",
+            )
+        )
+
     async def find_nearest_stations(call: ServiceCall) -> ServiceResponse:
         """Search in the range and return the matching items."""
         fuel = call.data["fuel"]
         distance = call.data["distance"]
+        ranking = call.data.get("ranking", RANKING_PRICE)
         entity_id = call.data["entity_id"]
         entity = hass.states.get(entity_id)
         if not entity:
@@ -108,12 +278,24 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             raise HomeAssistantError(
                 f"No coordinate attributes found for the entity {entity_id}"
             )
-        stations = await tool.find_nearest_station(
-            longitude=float(entity.attributes["longitude"]),
-            latitude=float(entity.attributes["latitude"]),
-            fuel=fuel,
-            distance=distance,
-        )
+        longitude = float(entity.attributes["longitude"])
+        latitude = float(entity.attributes["latitude"])
+        try:
+            stations = await tool.find_nearest_station(
+                longitude=longitude,
+                latitude=latitude,
+                fuel=fuel,
+                distance=distance,
+                stations=tiles.get_stations(latitude, longitude, distance),
+                ranking=ranking,
+                consumption=float(call.data.get("consumption", DEFAULT_CONSUMPTION)),
+                tank_size=float(call.data.get("tank_size", DEFAULT_TANK_SIZE)),
+            )
+        except (
+            PrixCarburantToolCannotConnectError,
+            PrixCarburantToolRequestError,
+        ) as err:
+            raise HomeAssistantError(f"Cannot find nearest stations: {err}") from err
         return {
             "stations": [
                 {
@@ -122,7 +304,13 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
                     "address": f"{station_data[ATTR_ADDRESS]}, {station_data[ATTR_POSTAL_CODE]} {station_data[ATTR_CITY]}",
                     "latitude": f"{station_data[ATTR_LATITUDE]}",
                     "longitude": f"{station_data[ATTR_LONGITUDE]}",
+                    "distance": station_data[ATTR_DISTANCE],
                 }
+                | (
+                    {"effective_cost": station_data[ATTR_EFFECTIVE_COST]}
+                    if ranking == RANKING_EFFECTIVE_COST
+                    else {}
+                )
                 for station_data in stations.values()
             ],
         }
@@ -133,9 +321,148 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         find_nearest_stations,
         supports_response=SupportsResponse.ONLY,
     )
+
+    async def profile(call: ServiceCall) -> ServiceResponse:
+        """Profile the next refreshes of stations prices."""
+        response = await async_profile_refreshes(hass, coordinator, call.data["count"])
+        return response if call.return_response else None
+
+    hass.services.async_register(
+        DOMAIN,
+        "profile",
+        profile,
+        schema=PROFILE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
     return True
 
 
+async def async_update_options(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Apply options changes in place, without reloading the entry."""
+    data = hass.data[DOMAIN][entry.entry_id]
+    tool: PrixCarburantTool = data["tool"]
+    coordinator: DataUpdateCoordinator = data["coordinator"]
+    options: dict = data["options"]
+    config: dict = entry.data | entry.options
+
+    if config.get(CONF_STATIONS) != options[CONF_STATIONS]:
+        _LOGGER.info("Stations list changed, reload entry")
+        hass.async_create_task(hass.config_entries.async_reload(entry.entry_id))
+        return
+
+    update_interval = int(config.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL))
+    if update_interval != options[CONF_SCAN_INTERVAL]:
+        _LOGGER.debug("Update interval changed to %s hours", update_interval)
+        options[CONF_SCAN_INTERVAL] = update_interval
+        coordinator.update_interval = timedelta(hours=update_interval)
+        data["history"].set_scan_interval(update_interval)
+
+    options[CONF_DISPLAY_ENTITY_PICTURES] = config.get(
+        CONF_DISPLAY_ENTITY_PICTURES, True
+    )
+    if (trackers := config.get(CONF_TRACKERS, [])) != options[CONF_TRACKERS]:
+        options[CONF_TRACKERS] = trackers
+        data["tiles"].async_set_trackers(trackers)
+
+    options[CONF_PRICE_CHANGE_THRESHOLD] = float(
+        config.get(CONF_PRICE_CHANGE_THRESHOLD, DEFAULT_PRICE_CHANGE_THRESHOLD)
+    )
+    enabled_fuels = get_enabled_fuels(config)
+    fuels_added = set(enabled_fuels) - set(options[CONF_FUELS])
+    fuels_changed = enabled_fuels != options[CONF_FUELS]
+    options[CONF_FUELS] = tool.fuels = enabled_fuels
+
+    if CONF_STATIONS not in config and (
+        fuels_changed or config[CONF_MAX_KM] != options[CONF_MAX_KM]
+    ):
+        # stations selling none of the enabled fuels are not discovered
+        options[CONF_MAX_KM] = config[CONF_MAX_KM]
+        await _async_update_stations_list(hass, entry, update_entities=False)
+
+    if fuels_added:
+        # prices of newly enabled fuels were not requested to the API
+        await coordinator.async_refresh()
+
+    # once prices of all enabled fuels are known
+    async_dispatcher_send(hass, SIGNAL_UPDATE_ENTITIES.format(entry.entry_id))
+
+
+async def _async_update_stations_list(
+    hass: HomeAssistant, entry: ConfigEntry, update_entities: bool = True
+) -> None:
+    """Diff stations within range against known ones and update entities."""
+    data = hass.data[DOMAIN][entry.entry_id]
+    tool: PrixCarburantTool = data["tool"]
+
+    _LOGGER.info("Update stations list within %s km", data["options"][CONF_MAX_KM])
+    added, removed = await tool.update_stations_from_location(
+        latitude=hass.config.latitude,
+        longitude=hass.config.longitude,
+        distance=data["options"][CONF_MAX_KM],
+    )
+    _LOGGER.info("%s stations added, %s removed", len(added), len(removed))
+    if update_entities and (added or removed):
+        async_dispatcher_send(hass, SIGNAL_UPDATE_ENTITIES.format(entry.entry_id))
+
+
+def _get_prices(stations: dict) -> dict[tuple[str, str], float]:
+    """Return prices of stations fuels."""
+    return {
+        (station_id, fuel): float(fuel_data[ATTR_PRICE])
+        for station_id, station_data in stations.items()
+        for fuel, fuel_data in station_data[ATTR_FUELS].items()
+    }
+
+
+def _get_prices_changes(
+    old_prices: dict[tuple[str, str], float], stations: dict, threshold: float
+) -> list[dict]:
+    """Return prices changes of stations fuels, at least as large as threshold."""
+    changes = []
+    for (station_id, fuel), new_price in _get_prices(stations).items():
+        if (old_price := old_prices.get((station_id, fuel))) is None:
+            continue
+        delta = round(new_price - old_price, 3)
+        if delta == 0 or abs(delta) < threshold:
+            continue
+        changes.append(
+            {
+                "station_id": station_id,
+                "fuel": fuel,
+                "old_price": old_price,
+                "new_price": new_price,
+                "delta": delta,
+            }
+        )
+    return changes
+
+
+async def async_remove_config_entry_device(
+    hass: HomeAssistant, entry: ConfigEntry, device: dr.DeviceEntry
+) -> bool:
+    """Allow removal of devices of stations no longer within range."""
+    tool: PrixCarburantTool = hass.data[DOMAIN][entry.entry_id]["tool"]
+    known_station_ids = {str(station_id) for station_id in tool.stations}
+    return not any(
+        identifier[0] == DOMAIN and str(identifier[1]) in known_station_ids
+        for identifier in device.identifiers
+    )
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    # services use the tool of the last loaded entry
+    if unload_ok and not any(
+        other_entry.state is ConfigEntryState.LOADED
+        for other_entry in hass.config_entries.async_entries(DOMAIN)
+        if other_entry.entry_id != entry.entry_id
+    ):
+        hass.services.async_remove(DOMAIN, "find_nearest_stations")
+        hass.services.async_remove(DOMAIN, "profile")
+    return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove data of a config entry."""
+    await PrixCarburantHistory(hass, entry.entry_id).async_remove()
@@ -15,14 +15,18 @@ from homeassistant.config_entries import (
 )
 from homeassistant.const import CONF_SCAN_INTERVAL
 from homeassistant.core import callback
+from homeassistant.helpers import selector
 
 from .const import (
     CONF_DISPLAY_ENTITY_PICTURES,
     CONF_FUELS,
     CONF_MAX_KM,
+    CONF_PRICE_CHANGE_THRESHOLD,
     CONF_STATIONS,
+    CONF_TRACKERS,
     DEFAULT_MAX_KM,
     DEFAULT_NAME,
+    DEFAULT_PRICE_CHANGE_THRESHOLD,
     DEFAULT_SCAN_INTERVAL,
     DOMAIN,
     FUELS,
@@ -43,6 +47,20 @@ def _build_schema(data: Mapping[str, Any], options: Mapping[str, Any]) -> vol.Sc
             CONF_DISPLAY_ENTITY_PICTURES,
             default=config.get(CONF_DISPLAY_ENTITY_PICTURES, True),
         ): bool,
+        vol.Required(
+            CONF_PRICE_CHANGE_THRESHOLD,
+            default=config.get(
+                CONF_PRICE_CHANGE_THRESHOLD, DEFAULT_PRICE_CHANGE_THRESHOLD
+            ),
+        ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(
+            CONF_TRACKERS,
+            default=config.get(CONF_TRACKERS, []),
+        ): selector.EntitySelector(
+            selector.EntitySelectorConfig(
+                domain=["device_tracker", "person"], multiple=True
+            )
+        ),
     }
     if CONF_STATIONS not in config:
         schema.update(
@@ -102,26 +120,17 @@ class PrixCarburantConfigFlow(ConfigFlow, domain=DOMAIN):
     @callback
     def async_get_options_flow(config_entry: ConfigEntry) -> OptionsFlow:
         """Define the config flow to handle options."""
-        return PrixCarburantOptionsFlowHandler(config_entry)
+        return PrixCarburantOptionsFlowHandler()
 
 
 class PrixCarburantOptionsFlowHandler(OptionsFlow):
     """Handle a PrixCarburant options flow."""
 
-    def __init__(self, config_entry: ConfigEntry) -> None:
-        """Initialize options flow."""
-        self.hass.config_entries.async_forward_entry_setup()
-
     async def async_step_init(self, user_input) -> ConfigFlowResult:
         """Manage the options."""
         errors: dict[str, str] = {}
         if user_input is not None:
-            self.hass.config_entries.async_update_entry(
-                self.config_entry, options=user_input
-            )
-            self.hass.async_create_task(
-                self.hass.config_entries.async_reload(self.config_entry.entry_id)
-            )
+            # options are applied in place by the entry update listener
             return self.async_create_entry(
                 title=DEFAULT_NAME,
                 data=user_input,
@@ -10,21 +10,40 @@ PLATFORMS: Final = [Platform.BUTTON, Platform.SENSOR]
 DEFAULT_NAME: Final = "Prix Carburant"
 DEFAULT_MAX_KM: Final = 15
 DEFAULT_SCAN_INTERVAL: Final = 4
+DEFAULT_DISCOVERY_INTERVAL: Final = 24
+DEFAULT_PRICE_CHANGE_THRESHOLD: Final = 0.0
+DEFAULT_CONSUMPTION: Final = 6.5
+DEFAULT_TANK_SIZE: Final = 40
+# days of price history statistics windows
+HISTORY_WINDOWS: Final = (7, 30)
+
+EVENT_PRICES_CHANGED: Final = f"{DOMAIN}_prices_changed"
+SIGNAL_UPDATE_ENTITIES: Final = f"{DOMAIN}_update_entities_{{}}"
 
 ATTR_ADDRESS = "address"
 ATTR_POSTAL_CODE = "postal_code"
 ATTR_BRAND = "brand"
 ATTR_CITY = "city"
 ATTR_DISTANCE = "distance"
+ATTR_EFFECTIVE_COST = "effective_cost"
 ATTR_FUELS = "fuels"
 ATTR_FUEL_TYPE = "fuel_type"
 ATTR_UPDATED_DATE = "updated_date"
 ATTR_DAYS_SINCE_LAST_UPDATE = "days_since_last_update"
 ATTR_PRICE = "price"
+ATTR_PRICE_MIN = "price_min"
+ATTR_PRICE_MAX = "price_max"
+ATTR_PRICE_MEAN = "price_mean"
+ATTR_PRICE_TREND = "price_trend"
 CONF_MAX_KM = "max_km"
 CONF_FUELS = "fuels"
 CONF_STATIONS = "stations"
 CONF_DISPLAY_ENTITY_PICTURES = "display_entity_pictures"
+CONF_PRICE_CHANGE_THRESHOLD = "price_change_threshold"
+CONF_TRACKERS = "trackers"
+
+RANKING_PRICE = "price"
+RANKING_EFFECTIVE_COST = "effective_cost"
 
 ATTR_GAZOLE = "Gazole"
 ATTR_SP95 = "SP95"
@@ -32,4 +51,5 @@ ATTR_SP98 = "SP98"
 ATTR_E10 = "E10"
 ATTR_E85 = "E85"
 ATTR_GPL = "GPLc"
+
 FUELS = [ATTR_E10, ATTR_E85, ATTR_SP95, ATTR_SP98, ATTR_GAZOLE, ATTR_GPL]
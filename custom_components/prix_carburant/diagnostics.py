@@ -0,0 +1,26 @@
+"""Diagnostics support for Prix Carburant."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .tools import PrixCarburantTool
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    data = hass.data[DOMAIN][entry.entry_id]
+    tool: PrixCarburantTool = data["tool"]
+
+    return {
+        "options": data["options"],
+        "fuels": tool.fuels,
+        "stations": len(tool.stations),
+        "transport": tool.transport_stats.as_dict(),
+    }
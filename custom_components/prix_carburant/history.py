@@ -0,0 +1,232 @@
+"""Price history of Prix Carburant stations."""
+
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterator
+import logging
+from math import ceil
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    ATTR_FUELS,
+    ATTR_PRICE,
+    ATTR_PRICE_MAX,
+    ATTR_PRICE_MEAN,
+    ATTR_PRICE_MIN,
+    ATTR_PRICE_TREND,
+    ATTR_UPDATED_DATE,
+    DEFAULT_SCAN_INTERVAL,
+    DOMAIN,
+    HISTORY_WINDOWS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+SAVE_DELAY = 60
+SECONDS_PER_DAY = 86400
+# statistics are computed again at most once per resolution, or on new samples
+STATISTICS_RESOLUTION = 3600
+
+
+def get_max_samples(scan_interval: int) -> int:
+    """Return the samples needed to cover the longest window, in refreshes.
+
+    Twice the scheduled refreshes, as manual refreshes add samples too.
+    """
+    return ceil(max(HISTORY_WINDOWS) * 24 / scan_interval) * 2 + 1
+
+
+class PriceBuffer:
+    """Samples of (timestamp, price) covering the longest statistics window."""
+
+    __slots__ = ("_max_samples", "_prices", "_start", "_statistics", "_timestamps")
+
+    def __init__(self, max_samples: int) -> None:
+        """Init buffer."""
+        self._timestamps = array("d")
+        self._prices = array("d")
+        self._start = 0
+        self._max_samples = max_samples
+        self._statistics: dict[float, tuple[float, float, float, float | None]] = {}
+
+    def __len__(self) -> int:
+        """Return the number of samples."""
+        return len(self._timestamps) - self._start
+
+    def set_max_samples(self, max_samples: int) -> None:
+        """Set the maximum number of samples, applied on next append."""
+        self._max_samples = max_samples
+
+    def append(self, timestamp: float, price: float) -> bool:
+        """Add a sample newer than the last one, return True if added."""
+        if len(self) and timestamp <= self._timestamps[-1]:
+            return False
+        self._timestamps.append(timestamp)
+        self._prices.append(price)
+        self._statistics.clear()
+
+        # drop samples out of the longest window, but the last one before it,
+        # which is the price in effect at its start
+        horizon = timestamp - max(HISTORY_WINDOWS) * SECONDS_PER_DAY
+        end = len(self._timestamps)
+        while self._start + 1 < end and (
+            self._timestamps[self._start + 1] <= horizon
+            or end - self._start > self._max_samples
+        ):
+            self._start += 1
+        if self._start > end // 2:
+            del self._timestamps[: self._start]
+            del self._prices[: self._start]
+            self._start = 0
+        return True
+
+    def samples(self) -> Iterator[tuple[float, float]]:
+        """Yield samples from the oldest to the newest."""
+        for index in range(self._start, len(self._timestamps)):
+            yield self._timestamps[index], self._prices[index]
+
+    def statistics(self, since: float) -> tuple[float, float, float, float | None]:
+        """Return min, max, mean and trend per day of prices since timestamp.
+
+        The price in effect at the start of the window is the last sample
+        before it, so it is included too. Results are cached until the next
+        sample.
+        """
+        if (cached := self._statistics.get(since)) is not None:
+            return cached
+
+        first = len(self._timestamps) - 1
+        while first > self._start and self._timestamps[first] > since:
+            first -= 1
+
+        count = 0
+        price_min = price_max = 0.0
+        sum_x = sum_y = sum_xx = sum_xy = 0.0
+        for index in range(first, len(self._timestamps)):
+            price = self._prices[index]
+            days = (max(self._timestamps[index], since) - since) / SECONDS_PER_DAY
+            if count == 0:
+                price_min = price_max = price
+            else:
+                price_min = min(price_min, price)
+                price_max = max(price_max, price)
+            count += 1
+            sum_x += days
+            sum_y += price
+            sum_xx += days * days
+            sum_xy += days * price
+
+        trend = None
+        if (denominator := count * sum_xx - sum_x * sum_x) > 0:
+            trend = (count * sum_xy - sum_x * sum_y) / denominator
+        statistics = self._statistics[since] = (
+            price_min,
+            price_max,
+            sum_y / count,
+            trend,
+        )
+        return statistics
+
+
+class PrixCarburantHistory:
+    """Price history of stations fuels, persisted across restarts."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry_id: str,
+        scan_interval: int = DEFAULT_SCAN_INTERVAL,
+    ) -> None:
+        """Init history."""
+        self._max_samples = get_max_samples(scan_interval)
+        self._store: Store[dict[str, list[list[float]]]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}_history"
+        )
+        self._buffers: dict[str, PriceBuffer] = {}
+
+    async def async_load(self) -> None:
+        """Load history from storage."""
+        if (data := await self._store.async_load()) is None:
+            return
+        for key, samples in data.items():
+            buffer = self._buffers[key] = PriceBuffer(self._max_samples)
+            for timestamp, price in samples:
+                buffer.append(timestamp, price)
+        _LOGGER.debug("Price history loaded for %s station fuels", len(data))
+
+    def set_scan_interval(self, scan_interval: int) -> None:
+        """Size buffers for a new scan interval."""
+        self._max_samples = get_max_samples(scan_interval)
+        for buffer in self._buffers.values():
+            buffer.set_max_samples(self._max_samples)
+
+    async def async_remove(self) -> None:
+        """Remove history from storage."""
+        await self._store.async_remove()
+
+    @callback
+    def async_record(self, stations: dict) -> None:
+        """Record prices of stations, then schedule a save."""
+        updated = False
+        keys = set()
+        for station_id, station_data in stations.items():
+            for fuel, fuel_data in station_data[ATTR_FUELS].items():
+                key = _get_key(station_id, fuel)
+                keys.add(key)
+                if (
+                    updated_date := dt_util.parse_datetime(
+                        str(fuel_data[ATTR_UPDATED_DATE])
+                    )
+                ) is None:
+                    updated_date = dt_util.utcnow()
+                if (buffer := self._buffers.get(key)) is None:
+                    buffer = self._buffers[key] = PriceBuffer(self._max_samples)
+                updated |= buffer.append(
+                    updated_date.timestamp(), float(fuel_data[ATTR_PRICE])
+                )
+
+        for key in set(self._buffers) - keys:
+            del self._buffers[key]
+            updated = True
+        if updated:
+            self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    def statistics(self, station_id: str, fuel: str) -> dict[str, float | None]:
+        """Return rolling statistics attributes of a station fuel."""
+        attributes: dict[str, float | None] = {}
+        buffer = self._buffers.get(_get_key(station_id, fuel))
+        now = dt_util.utcnow().timestamp()
+        now -= now % STATISTICS_RESOLUTION
+        for days in HISTORY_WINDOWS:
+            price_min = price_max = price_mean = price_trend = None
+            if buffer:
+                price_min, price_max, price_mean, price_trend = buffer.statistics(
+                    now - days * SECONDS_PER_DAY
+                )
+            attributes[f"{ATTR_PRICE_MIN}_{days}d"] = price_min
+            attributes[f"{ATTR_PRICE_MAX}_{days}d"] = price_max
+            attributes[f"{ATTR_PRICE_MEAN}_{days}d"] = (
+                None if price_mean is None else round(price_mean, 3)
+            )
+            attributes[f"{ATTR_PRICE_TREND}_{days}d"] = (
+                None if price_trend is None else round(price_trend, 4)
+            )
+        return attributes
+
+    @callback
+    def _data_to_save(self) -> dict[str, list[list[float]]]:
+        """Return data of history to store."""
+        return {
+            key: [[timestamp, price] for timestamp, price in buffer.samples()]
+            for key, buffer in self._buffers.items()
+        }
+
+
+def _get_key(station_id: str, fuel: str) -> str:
+    """Return key of a station fuel."""
+    return f"{station_id}_{fuel}"
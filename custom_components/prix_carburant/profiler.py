@@ -0,0 +1,135 @@
+"""Profiler for Prix Carburant refresh cycles."""
+
+from __future__ import annotations
+
+from asyncio import AbstractEventLoop, TimerHandle
+import cProfile
+import logging
+import pstats
+import time
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+LOOP_MONITOR_INTERVAL = 0.01
+LOOP_BLOCKING_THRESHOLD = 0.05
+REPORT_TOP_FUNCTIONS = 15
+
+
+class LoopBlockingMonitor:
+    """Measure event loop blocking durations with a heartbeat callback."""
+
+    def __init__(self, loop: AbstractEventLoop) -> None:
+        """Init monitor."""
+        self._loop = loop
+        self._expected = 0.0
+        self._handle: TimerHandle | None = None
+        self.blockings: list[float] = []
+
+    def start(self) -> None:
+        """Start the heartbeat."""
+        self._expected = self._loop.time() + LOOP_MONITOR_INTERVAL
+        self._handle = self._loop.call_later(LOOP_MONITOR_INTERVAL, self._tick)
+
+    def stop(self) -> None:
+        """Stop the heartbeat, recording the blocking since the last one."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+            if (lag := self._loop.time() - self._expected) > LOOP_BLOCKING_THRESHOLD:
+                self.blockings.append(lag)
+
+    def _tick(self) -> None:
+        """Record the delay of the heartbeat and schedule the next one."""
+        now = self._loop.time()
+        if (lag := now - self._expected) > LOOP_BLOCKING_THRESHOLD:
+            self.blockings.append(lag)
+        self._expected = now + LOOP_MONITOR_INTERVAL
+        self._handle = self._loop.call_later(LOOP_MONITOR_INTERVAL, self._tick)
+
+
+async def async_profile_refreshes(
+    hass: HomeAssistant, coordinator: DataUpdateCoordinator, count: int
+) -> dict[str, Any]:
+    """Profile refreshes of the coordinator and write a report file.
+
+    The profiler runs on the event loop thread, so other tasks running
+    during a refresh are part of the report too.
+    """
+    profiler = cProfile.Profile()
+    runs = []
+    for _ in range(count):
+        monitor = LoopBlockingMonitor(hass.loop)
+        monitor.start()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError as err:
+            monitor.stop()
+            raise HomeAssistantError(f"Cannot start profiler: {err}") from err
+        try:
+            await coordinator.async_refresh()
+        finally:
+            profiler.disable()
+            monitor.stop()
+        runs.append(
+            {
+                "duration": round(time.perf_counter() - start, 3),
+                "success": coordinator.last_update_success,
+                "loop_blockings": len(monitor.blockings),
+                "loop_blocking_max": round(max(monitor.blockings, default=0), 3),
+                "loop_blocking_total": round(sum(monitor.blockings), 3),
+            }
+        )
+
+    report_file = hass.config.path(
+        f"{DOMAIN}_profile_{time.strftime('%Y%m%d_%H%M%S')}.txt"
+    )
+    top_functions = await hass.async_add_executor_job(
+        _write_report, profiler, report_file, runs
+    )
+    _LOGGER.info("Profile report written to %s", report_file)
+    return {
+        "report_file": report_file,
+        "runs": runs,
+        "top_functions": top_functions,
+    }
+
+
+def _write_report(
+    profiler: cProfile.Profile, report_file: str, runs: list[dict]
+) -> list[dict]:
+    """Write the profile report and return the most expensive functions."""
+    with open(report_file, "w", encoding="UTF-8") as file:
+        for index, run in enumerate(runs, start=1):
+            file.write(f"Refresh {index}: {run}\n")
+        file.write("\n")
+        stats = pstats.Stats(profiler, stream=file)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(100)
+
+    top_functions = sorted(
+        stats.stats.items(),  # type: ignore[attr-defined]
+        key=lambda item: item[1][3],
+        reverse=True,
+    )[:REPORT_TOP_FUNCTIONS]
+    return [
+        {
+            "function": f"{filename}:{line}({name})",
+            "calls": calls,
+            "total_time": round(total_time, 4),
+            "cumulative_time": round(cumulative_time, 4),
+        }
+        for (filename, line, name), (
+            _,
+            calls,
+            total_time,
+            cumulative_time,
+            _,
+        ) in top_functions
+    ]
@@ -14,9 +14,10 @@ from homeassistant.components.sensor import (
 )
 from homeassistant.config_entries import SOURCE_IMPORT, ConfigEntry
 from homeassistant.const import ATTR_LATITUDE, ATTR_LONGITUDE, ATTR_NAME, CURRENCY_EURO
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
@@ -31,13 +32,19 @@ from .const import (
     ATTR_FUELS,
     ATTR_POSTAL_CODE,
     ATTR_PRICE,
+    ATTR_PRICE_MAX,
+    ATTR_PRICE_MEAN,
+    ATTR_PRICE_MIN,
+    ATTR_PRICE_TREND,
     ATTR_UPDATED_DATE,
     CONF_DISPLAY_ENTITY_PICTURES,
     CONF_FUELS,
     CONF_STATIONS,
     DOMAIN,
-    FUELS,
+    HISTORY_WINDOWS,
+    SIGNAL_UPDATE_ENTITIES,
 )
+from .history import PrixCarburantHistory
 from .tools import PrixCarburantTool, get_entity_picture, normalize_string
 
 _LOGGER = logging.getLogger(__name__)
@@ -73,27 +80,45 @@ async def async_setup_entry(
 ) -> None:
     """Set up the platform from config_entry."""
     data = hass.data[DOMAIN][entry.entry_id]
-    config = entry.data
-    options = entry.options
-
     tool: PrixCarburantTool = data["tool"]
+    entities: dict[tuple[str, str], PrixCarburant] = {}
+
+    @callback
+    def async_update_entities(update_before_add: bool = False) -> None:
+        """Add and remove entities according to stations and enabled fuels."""
+        wanted = {
+            (station_id, fuel)
+            for station_id, station_data in tool.stations.items()
+            for fuel in data["options"][CONF_FUELS]
+            if fuel in station_data[ATTR_FUELS]
+        }
 
-    enabled_fuels = {}
-    for fuel in FUELS:
-        fuel_key = f"{CONF_FUELS}_{fuel}"
-        enabled_fuels[fuel] = options.get(fuel_key, config.get(fuel_key, True))
-
-    entities = []
-    for station_id, station_data in tool.stations.items():
-        entities.extend(
-            [
-                PrixCarburant(station_id, station_data, f, data)
-                for f in FUELS
-                if f in station_data[ATTR_FUELS] and enabled_fuels[f] is True
-            ]
-        )
+        # registry entries and devices are kept, with their customizations
+        for key in set(entities) - wanted:
+            entity = entities.pop(key)
+            if entity.hass is not None:
+                hass.async_create_task(entity.async_remove())
 
-    async_add_entities(entities, True)
+        for entity in entities.values():
+            entity.async_update_entity_picture()
+
+        new_entities = {
+            (station_id, fuel): PrixCarburant(
+                station_id, tool.stations[station_id], fuel, data
+            )
+            for station_id, fuel in wanted - set(entities)
+        }
+        if new_entities:
+            _LOGGER.debug("Add %s entities", len(new_entities))
+            entities.update(new_entities)
+            async_add_entities(new_entities.values(), update_before_add)
+
+    async_update_entities(update_before_add=True)
+    entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, SIGNAL_UPDATE_ENTITIES.format(entry.entry_id), async_update_entities
+        )
+    )
 
 
 class PrixCarburant(CoordinatorEntity, RestoreSensor):
@@ -102,6 +127,16 @@ class PrixCarburant(CoordinatorEntity, RestoreSensor):
     _attr_icon = "mdi:gas-station"
     _attr_device_class = SensorDeviceClass.MONETARY
     _attr_native_unit_of_measurement = CURRENCY_EURO
+    _unrecorded_attributes = frozenset(
+        f"{attr}_{days}d"
+        for attr in (
+            ATTR_PRICE_MIN,
+            ATTR_PRICE_MAX,
+            ATTR_PRICE_MEAN,
+            ATTR_PRICE_TREND,
+        )
+        for days in HISTORY_WINDOWS
+    )
 
     def __init__(
         self, station_id: str, station_info: dict, fuel: str, entry_data: dict
@@ -120,10 +155,9 @@ class PrixCarburant(CoordinatorEntity, RestoreSensor):
             station_name = f"Station {self.station_id}"
         self._attr_name = f"{station_name} {self.fuel}"
 
-        if entry_data["options"][CONF_DISPLAY_ENTITY_PICTURES] is True:
-            self._attr_entity_picture = get_entity_picture(
-                self.station_info[ATTR_BRAND]
-            )
+        self._options = entry_data["options"]
+        self._history: PrixCarburantHistory = entry_data["history"]
+        self._set_entity_picture()
 
         self._attr_device_info = DeviceInfo(
             identifiers={(DOMAIN, self.station_id)},
@@ -146,10 +180,29 @@ class PrixCarburant(CoordinatorEntity, RestoreSensor):
             ATTR_FUEL_TYPE: self.fuel,
         }
 
+    def _set_entity_picture(self) -> None:
+        """Set entity picture according to options."""
+        if self._options[CONF_DISPLAY_ENTITY_PICTURES] is True:
+            self._attr_entity_picture = get_entity_picture(
+                self.station_info[ATTR_BRAND]
+            )
+        else:
+            self._attr_entity_picture = None
+
+    @callback
+    def async_update_entity_picture(self) -> None:
+        """Update entity picture after an options change."""
+        entity_picture = self._attr_entity_picture
+        self._set_entity_picture()
+        if self.hass is not None and entity_picture != self._attr_entity_picture:
+            self.async_write_ha_state()
+
     @property
     def native_value(self) -> float | None:
         """Return the current price."""
-        fuel = self.coordinator.data[self.station_id][ATTR_FUELS].get(self.fuel)
+        if (station := self.coordinator.data.get(self.station_id)) is None:
+            return None
+        fuel = station[ATTR_FUELS].get(self.fuel)
         if fuel:
             # Update date in attributes
             self._attr_extra_state_attributes[ATTR_UPDATED_DATE] = fuel[
@@ -168,6 +221,10 @@ class PrixCarburant(CoordinatorEntity, RestoreSensor):
                     self._attr_name,
                     err,
                 )
+            # Update price history statistics in attributes
+            self._attr_extra_state_attributes.update(
+                self._history.statistics(self.station_id, self.fuel)
+            )
             # return price
             return float(fuel[ATTR_PRICE])
         return None
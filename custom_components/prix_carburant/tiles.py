@@ -0,0 +1,272 @@
+"""Stations tiles prefetched around moving trackers."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Iterable
+import logging
+from math import asin, atan2, cos, degrees, radians, sin
+import time
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import ATTR_LATITUDE, ATTR_LONGITUDE
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.event import (
+    EventStateChangedData,
+    async_track_state_change_event,
+)
+
+from .tools import (
+    PrixCarburantTool,
+    PrixCarburantToolCannotConnectError,
+    PrixCarburantToolRequestError,
+    get_distance,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS = 6371
+# geohash of 4 characters is a tile of about 39 x 20 km
+TILE_PRECISION = 4
+TILE_CACHE_SIZE = 32
+TILE_TTL = 1800
+# distance around and ahead of trackers covered by prefetched tiles, in km
+PREFETCH_DISTANCE = 10
+PREFETCH_AHEAD = 15
+# minimal move to compute the heading of a tracker, in km
+HEADING_MIN_MOVE = 0.2
+
+
+class PrixCarburantTileCache:
+    """LRU cache of stations tiles, prefetched around and ahead of trackers."""
+
+    def __init__(
+        self, hass: HomeAssistant, entry: ConfigEntry, tool: PrixCarburantTool
+    ) -> None:
+        """Init cache."""
+        self._hass = hass
+        self._entry = entry
+        self._tool = tool
+        self._tiles: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._fetching: set[str] = set()
+        self._positions: dict[str, tuple[float, float]] = {}
+        self._headings: dict[str, float] = {}
+        self._unsub: CALLBACK_TYPE | None = None
+
+    @callback
+    def async_set_trackers(self, entity_ids: Iterable[str]) -> None:
+        """Follow position changes of the trackers."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        self._positions.clear()
+        self._headings.clear()
+        if entity_ids := list(entity_ids):
+            _LOGGER.debug("Follow trackers %s", entity_ids)
+            self._unsub = async_track_state_change_event(
+                self._hass, entity_ids, self._async_tracker_changed
+            )
+            for entity_id in entity_ids:
+                if state := self._hass.states.get(entity_id):
+                    self._async_update_position(
+                        entity_id,
+                        state.attributes.get(ATTR_LATITUDE),
+                        state.attributes.get(ATTR_LONGITUDE),
+                    )
+
+    def get_stations(
+        self, latitude: float, longitude: float, distance: float
+    ) -> dict | None:
+        """Return stations of warm tiles covering the area, None if any is cold."""
+        stations: dict = {}
+        now = time.monotonic()
+        for tile in tiles_covering(latitude, longitude, distance):
+            if not self._is_warm(tile, now):
+                return None
+            self._tiles.move_to_end(tile)
+            stations.update(self._tiles[tile][1])
+        return stations
+
+    def _is_warm(self, tile: str, now: float) -> bool:
+        """Return True if stations of the tile are cached and fresh."""
+        return (cached := self._tiles.get(tile)) is not None and (
+            now - cached[0] <= TILE_TTL
+        )
+
+    @callback
+    def _async_tracker_changed(self, event: Event[EventStateChangedData]) -> None:
+        """Prefetch tiles when a tracker moves."""
+        if (state := event.data["new_state"]) is None:
+            return
+        self._async_update_position(
+            event.data["entity_id"],
+            state.attributes.get(ATTR_LATITUDE),
+            state.attributes.get(ATTR_LONGITUDE),
+        )
+
+    @callback
+    def _async_update_position(
+        self, entity_id: str, latitude: float | None, longitude: float | None
+    ) -> None:
+        """Update position and heading of a tracker, then prefetch tiles."""
+        if latitude is None or longitude is None:
+            return
+        latitude, longitude = float(latitude), float(longitude)
+        previous = self._positions.get(entity_id)
+        if previous is None or (
+            get_distance(previous[1], previous[0], longitude, latitude)
+            >= HEADING_MIN_MOVE
+        ):
+            if previous is not None:
+                self._headings[entity_id] = _get_bearing(
+                    *previous, latitude, longitude
+                )
+            self._positions[entity_id] = (latitude, longitude)
+
+        tiles = tiles_covering(latitude, longitude, PREFETCH_DISTANCE)
+        if (heading := self._headings.get(entity_id)) is not None:
+            tiles |= tiles_covering(
+                *_get_destination(latitude, longitude, heading, PREFETCH_AHEAD),
+                PREFETCH_DISTANCE,
+            )
+
+        now = time.monotonic()
+        if tiles := {
+            tile for tile in tiles - self._fetching if not self._is_warm(tile, now)
+        }:
+            self._fetching |= tiles
+            # cancelled when the entry is unloaded
+            self._entry.async_create_background_task(
+                self._hass,
+                self._async_prefetch(tiles),
+                f"prix_carburant prefetch {entity_id}",
+            )
+
+    async def _async_prefetch(self, tiles: set[str]) -> None:
+        """Fetch stations of tiles, one after the other."""
+        try:
+            for tile in tiles:
+                _LOGGER.debug("Prefetch stations of tile %s", tile)
+                stations = await self._tool.fetch_stations_in_area(
+                    *geohash_bbox(tile)
+                )
+                self._tiles[tile] = (time.monotonic(), stations)
+                self._tiles.move_to_end(tile)
+                if len(self._tiles) > TILE_CACHE_SIZE:
+                    self._tiles.popitem(last=False)
+                self._fetching.discard(tile)
+        except (
+            PrixCarburantToolCannotConnectError,
+            PrixCarburantToolRequestError,
+        ) as err:
+            _LOGGER.debug("Cannot prefetch stations tiles: %s", err)
+        finally:
+            self._fetching -= tiles
+
+
+def geohash_encode(
+    latitude: float, longitude: float, precision: int = TILE_PRECISION
+) -> str:
+    """Return the geohash of a location."""
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    geohash = []
+    bits = bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        value_range, value = (
+            (longitude_range, longitude) if even else (latitude_range, latitude)
+        )
+        middle = (value_range[0] + value_range[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            value_range[0] = middle
+        else:
+            bits *= 2
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_BASE32[bits])
+            bits = bit_count = 0
+    return "".join(geohash)
+
+
+def geohash_bbox(geohash: str) -> tuple[float, float, float, float]:
+    """Return south, west, north and east bounds of a geohash."""
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            value_range = longitude_range if even else latitude_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if (bits >> shift) & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            even = not even
+    return latitude_range[0], longitude_range[0], latitude_range[1], longitude_range[1]
+
+
+def tiles_covering(
+    latitude: float, longitude: float, distance: float, precision: int = TILE_PRECISION
+) -> set[str]:
+    """Return geohashes of tiles covering the distance around a location."""
+    latitude_bits = precision * 5 // 2
+    tile_height = 180 / 2**latitude_bits
+    tile_width = 360 / 2 ** (precision * 5 - latitude_bits)
+    delta_latitude = degrees(distance / EARTH_RADIUS)
+    delta_longitude = degrees(
+        distance / (EARTH_RADIUS * max(cos(radians(latitude)), 0.01))
+    )
+    south = max(latitude - delta_latitude, -90.0)
+    north = min(latitude + delta_latitude, 89.999999)
+    west = longitude - delta_longitude
+    east = longitude + delta_longitude
+
+    tiles = set()
+    tile_latitude = south
+    while True:
+        tile_longitude = west
+        while True:
+            tiles.add(
+                geohash_encode(
+                    tile_latitude, (tile_longitude + 180) % 360 - 180, precision
+                )
+            )
+            if tile_longitude >= east:
+                break
+            tile_longitude = min(tile_longitude + tile_width, east)
+        if tile_latitude >= north:
+            break
+        tile_latitude = min(tile_latitude + tile_height, north)
+    return tiles
+
+
+def _get_bearing(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Return the initial bearing in degrees from a location to another."""
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    dlon = lon2 - lon1
+    return degrees(
+        atan2(
+            sin(dlon) * cos(lat2),
+            cos(lat1) * sin(lat2) - sin(lat1) * cos(lat2) * cos(dlon),
+        )
+    )
+
+
+def _get_destination(
+    latitude: float, longitude: float, bearing: float, distance: float
+) -> tuple[float, float]:
+    """Return the location at distance in km following the bearing."""
+    lat1, lon1, bearing = map(radians, [latitude, longitude, bearing])
+    angular = distance / EARTH_RADIUS
+    lat2 = asin(sin(lat1) * cos(angular) + cos(lat1) * sin(angular) * cos(bearing))
+    lon2 = lon1 + atan2(
+        sin(bearing) * sin(angular) * cos(lat1),
+        cos(angular) - sin(lat1) * sin(lat2),
+    )
+    return degrees(lat2), degrees(lon2)
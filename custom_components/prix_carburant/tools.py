@@ -1,32 +1,99 @@
 """Tools for Prix Carburant."""
 
-from asyncio import timeout
+from asyncio import Lock, timeout
+import codecs
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterable, Mapping
+from dataclasses import asdict, dataclass
+import importlib.util
 import json
 import logging
 from math import atan2, cos, radians, sin, sqrt
 import os
+import re
 from socket import gaierror
+from typing import Any
 
-from aiohttp import ClientError, ClientSession
+from aiohttp import ClientError, ClientSession, TCPConnector, TraceConfig, hdrs
 
 from homeassistant.const import ATTR_LATITUDE, ATTR_LONGITUDE, ATTR_NAME
+from homeassistant.util.ssl import client_context
 
 from .const import (
     ATTR_ADDRESS,
     ATTR_BRAND,
     ATTR_CITY,
     ATTR_DISTANCE,
+    ATTR_EFFECTIVE_COST,
     ATTR_FUELS,
     ATTR_POSTAL_CODE,
     ATTR_PRICE,
     ATTR_UPDATED_DATE,
+    CONF_FUELS,
+    DEFAULT_CONSUMPTION,
+    DEFAULT_TANK_SIZE,
     FUELS,
+    RANKING_EFFECTIVE_COST,
+    RANKING_PRICE,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
 PRIX_CARBURANT_API_URL = "https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/prix-des-carburants-en-france-flux-instantane-v2/records"
 STATIONS_NAME_FILE = "stations_name.json"
+STATION_FIELDS = [
+    "id",
+    "latitude",
+    "longitude",
+    "cp",
+    "ad" + "resse",  # split string to avoid codespell french word
+    "ville",
+]
+NEAREST_STATIONS_COUNT = 10
+NEAREST_STATIONS_CANDIDATES = 100
+RESULTS_START = re.compile(r'"results"\s*:\s*\[')
+
+# transport settings of the dedicated API session
+HAS_BROTLI = any(
+    importlib.util.find_spec(module) is not None
+    for module in ("brotli", "brotlicffi")
+)
+ACCEPT_ENCODING = "gzip, deflate, br" if HAS_BROTLI else "gzip, deflate"
+CONNECTION_POOL_SIZE = 4
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
+VALIDATORS_CACHE_SIZE = 512
+
+
+@dataclass
+class PrixCarburantTransportStats:
+    """Counters of the API transport."""
+
+    requests: int = 0
+    not_modified: int = 0
+    # wire and decoded sizes of responses with a Content-Length
+    bytes_received: int = 0
+    bytes_decoded: int = 0
+    # responses without Content-Length, whose wire size is unknown
+    unsized_responses: int = 0
+    unsized_bytes_decoded: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+    dns_resolutions: int = 0
+    dns_cache_hits: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        """Return counters as a dict."""
+        return asdict(self)
+
+    def count_response(self, content_length: int | None, bytes_decoded: int) -> None:
+        """Count sizes of a response body."""
+        if content_length is None:
+            self.unsized_responses += 1
+            self.unsized_bytes_decoded += bytes_decoded
+        else:
+            self.bytes_received += content_length
+            self.bytes_decoded += bytes_decoded
 
 
 class PrixCarburantTool:
@@ -37,11 +104,16 @@ class PrixCarburantTool:
         time_zone: str = "Europe/Paris",
         request_timeout: int = 30,
         session: ClientSession | None = None,
+        fuels: list[str] | None = None,
+        api_url: str | None = None,
     ) -> None:
         """Init tool."""
         self._user_time_zone = time_zone
+        self._api_url = api_url or PRIX_CARBURANT_API_URL
+        self._fuels = list(FUELS if fuels is None else fuels)
         self._local_stations_data: dict[str, dict] = {}
         self._stations_data: dict[str, dict] = {}
+        self._discovery_lock = Lock()
 
         _LOGGER.debug("Load stations data from local file %s", STATIONS_NAME_FILE)
         with open(
@@ -55,16 +127,49 @@ class PrixCarburantTool:
         self._request_timeout = request_timeout
         self._session = session
         self._close_session = False
-
-        if self._session is None:
-            self._session = ClientSession()
-            self._close_session = True
+        self._closed = False
+        self._transport_stats = PrixCarburantTransportStats()
+        # ETag/Last-Modified validators and content of previous responses
+        self._validators: OrderedDict[str, tuple[str | None, str | None, dict]] = (
+            OrderedDict()
+        )
 
     @property
     def stations(self) -> dict:
         """Return stations information."""
         return self._stations_data
 
+    @property
+    def transport_stats(self) -> PrixCarburantTransportStats:
+        """Return counters of the API transport."""
+        return self._transport_stats
+
+    @property
+    def fuels(self) -> list[str]:
+        """Return fuels requested to the API."""
+        return self._fuels
+
+    @fuels.setter
+    def fuels(self, fuels: list[str]) -> None:
+        """Set fuels requested to the API."""
+        self._fuels = [fuel for fuel in FUELS if fuel in fuels]
+
+    def _get_session(self) -> ClientSession:
+        """Return the session, create a dedicated one if none was given."""
+        if self._closed:
+            raise PrixCarburantToolCannotConnectError("Prix Carburant tool is closed.")
+        if self._session is None:
+            self._session = _create_session(self._transport_stats)
+            self._close_session = True
+        return self._session
+
+    async def close(self) -> None:
+        """Close the session if created by the tool, then refuse requests."""
+        self._closed = True
+        if self._session is not None and self._close_session:
+            await self._session.close()
+            self._session = None
+
     async def _request_api(
         self,
         params: dict,
@@ -77,14 +182,49 @@ class PrixCarburantTool:
                     "timezone": self._user_time_zone,
                 }
             )
+            cache_key = json.dumps(params, sort_keys=True)
+            headers = {hdrs.ACCEPT_ENCODING: ACCEPT_ENCODING}
+            if cached := self._validators.get(cache_key):
+                etag, last_modified, _ = cached
+                if etag:
+                    headers[hdrs.IF_NONE_MATCH] = etag
+                if last_modified:
+                    headers[hdrs.IF_MODIFIED_SINCE] = last_modified
+
             async with timeout(self._request_timeout):
-                response = await self._session.request(  # type: ignore[union-attr]
-                    method="GET", url=PRIX_CARBURANT_API_URL, params=params
+                response = await self._get_session().request(
+                    method="GET",
+                    url=self._api_url,
+                    params=params,
+                    headers=headers,
+                )
+                self._transport_stats.requests += 1
+                if response.status == 304 and cached:
+                    response.release()
+                    self._transport_stats.not_modified += 1
+                    self._validators.move_to_end(cache_key)
+                    return cached[2]
+
+                body = await response.read()
+                self._transport_stats.count_response(
+                    response.content_length, len(body)
                 )
-                content = await response.json()
+                try:
+                    content = json.loads(body)
+                except ValueError as exception:
+                    raise PrixCarburantToolRequestError(
+                        f"API request error {response.status}: invalid JSON"
+                    ) from exception
 
                 if response.status == 200 and "results" in content:
                     response.close()
+                    etag = response.headers.get(hdrs.ETAG)
+                    last_modified = response.headers.get(hdrs.LAST_MODIFIED)
+                    if etag or last_modified:
+                        self._validators[cache_key] = (etag, last_modified, content)
+                        self._validators.move_to_end(cache_key)
+                        if len(self._validators) > VALIDATORS_CACHE_SIZE:
+                            self._validators.popitem(last=False)
                     return content
 
                 raise PrixCarburantToolRequestError(
@@ -100,12 +240,68 @@ class PrixCarburantTool:
                 "Error occurred while communicating with the Prix Carburant API."
             ) from exception
 
+    async def _stream_api(
+        self,
+        params: dict,
+    ) -> AsyncIterator[dict]:
+        """Make a request to the JSON API and yield records as they arrive."""
+        try:
+            params.update(
+                {
+                    "lang": "fr",
+                    "timezone": self._user_time_zone,
+                }
+            )
+            async with timeout(self._request_timeout):
+                response = await self._get_session().request(
+                    method="GET",
+                    url=self._api_url,
+                    params=params,
+                    headers={hdrs.ACCEPT_ENCODING: ACCEPT_ENCODING},
+                )
+            self._transport_stats.requests += 1
+            async with response:
+                if response.status != 200:
+                    async with timeout(self._request_timeout):
+                        content = await response.text()
+                    raise PrixCarburantToolRequestError(
+                        f"API request error {response.status}: {content}"
+                    )
+
+                parser = _RecordsParser()
+                bytes_decoded = 0
+                while True:
+                    async with timeout(self._request_timeout):
+                        chunk = await response.content.readany()
+                    if not chunk:
+                        break
+                    bytes_decoded += len(chunk)
+                    for record in parser.feed(chunk):
+                        yield record
+                self._transport_stats.count_response(
+                    response.content_length, bytes_decoded
+                )
+
+                if not parser.done:
+                    raise PrixCarburantToolRequestError(
+                        "API request error: incomplete response"
+                    )
+
+        except TimeoutError as exception:
+            raise PrixCarburantToolCannotConnectError(
+                "Timeout occurred while connecting to Prix Carburant API."
+            ) from exception
+        except (ClientError, gaierror) as exception:
+            raise PrixCarburantToolCannotConnectError(
+                "Error occurred while communicating with the Prix Carburant API."
+            ) from exception
+
     async def init_stations_from_list(
         self, stations_ids: list[int], latitude: float, longitude: float
     ) -> None:
         """Get data from station list ID."""
         data = {}
-        _LOGGER.debug("Call %s API to retrieve station data", PRIX_CARBURANT_API_URL)
+        _LOGGER.debug("Call %s API to retrieve station data", self._api_url)
 
         for station_id in stations_ids:
             _LOGGER.debug(
@@ -114,9 +310,8 @@ class PrixCarburantTool:
             )
             response = await self._request_api(
                 {
-                    "select": "id,latitude,longitude,cp,ad"
-                    "resse,ville",  # split string to avoid codespell french word
-                    "where": f"id={station_id}",
+                    "select": _query_select(STATION_FIELDS),
+                    "where": _query_where(_where_ids([station_id])),
                     "limit": 1,
                 }
             )
@@ -143,11 +338,14 @@ class PrixCarburantTool:
     ) -> None:
         """Get data from near stations."""
         data = {}
-        _LOGGER.debug("Call %s API to retrieve station data", PRIX_CARBURANT_API_URL)
+        _LOGGER.debug("Call %s API to retrieve station data", self._api_url)
+        query_where = _query_where(
+            _where_distance(longitude, latitude, distance), fuels=self._fuels
+        )
         response_count = await self._request_api(
             {
                 "select": "id",
-                "where": f"distance(geom, geom'POINT({longitude} {latitude})', {distance}km)",
+                "where": query_where,
                 "limit": 1,
             }
         )
@@ -166,17 +364,14 @@ class PrixCarburantTool:
                 query_limit,
                 stations_count,
             )
-            async with timeout(self._request_timeout):
-                response = await self._request_api(
-                    {
-                        "select": "id,latitude,longitude,cp,ad"
-                        "resse,ville",  # split string to avoid codespell french word
-                        "where": f"distance(geom, geom'POINT({longitude} {latitude})', {distance}km)",
-                        "offset": query_offset,
-                        "limit": query_limit,
-                    }
-                )
-            for station in response["results"]:
+            async for station in self._stream_api(
+                {
+                    "select": _query_select(STATION_FIELDS),
+                    "where": query_where,
+                    "offset": query_offset,
+                    "limit": query_limit,
+                }
+            ):
                 data.update(
                     self._build_station_data(
                         station, user_longitude=longitude, user_latitude=latitude
@@ -185,22 +380,119 @@ class PrixCarburantTool:
 
         self._stations_data = data
 
-    async def update_stations_prices(self) -> None:
-        """Update prices of specified stations."""
-        _LOGGER.debug("Call %s API to retrieve fuel prices", PRIX_CARBURANT_API_URL)
-        query_select = ",".join(
-            [f"{f.lower()}_prix" for f in FUELS] + [f"{f.lower()}_maj" for f in FUELS]
+    async def update_stations_from_location(
+        self,
+        latitude: float,
+        longitude: float,
+        distance: int,
+    ) -> tuple[set[str], set[str]]:
+        """Diff stations near the location against known ones.
+
+        Only the metadata and prices of newly covered stations are fetched,
+        stations out of range are dropped. Return added and removed IDs.
+        """
+        async with self._discovery_lock:
+            return await self._update_stations_from_location(
+                latitude, longitude, distance
+            )
+
+    async def _update_stations_from_location(
+        self,
+        latitude: float,
+        longitude: float,
+        distance: int,
+    ) -> tuple[set[str], set[str]]:
+        _LOGGER.debug("Call %s API to retrieve station IDs", self._api_url)
+        where = _query_where(
+            _where_distance(longitude, latitude, distance), fuels=self._fuels
         )
-        for station_id, station_data in self._stations_data.items():
+        response_count = await self._request_api(
+            {"select": "id", "where": where, "limit": 1}
+        )
+        stations_count = response_count["total_count"]
+
+        station_ids: set[str] = set()
+        for query_offset in range(0, stations_count, 100):
+            async for station in self._stream_api(
+                {
+                    "select": "id",
+                    "where": where,
+                    "offset": query_offset,
+                    "limit": min(100, stations_count - query_offset),
+                }
+            ):
+                station_ids.add(str(station["id"]))
+
+        known_ids = {str(station_id) for station_id in self._stations_data}
+        added_ids = station_ids - known_ids
+        removed_ids = known_ids - station_ids
+        _LOGGER.debug(
+            "%s stations in range, %s new, %s out of range",
+            len(station_ids),
+            len(added_ids),
+            len(removed_ids),
+        )
+
+        for station_id in list(self._stations_data):
+            if str(station_id) in removed_ids:
+                del self._stations_data[station_id]
+
+        new_ids = sorted(added_ids)
+        for chunk_offset in range(0, len(new_ids), 50):
+            chunk = new_ids[chunk_offset : chunk_offset + 50]
+            async for station in self._stream_api(
+                {
+                    "select": _query_select(STATION_FIELDS),
+                    "where": _query_where(_where_ids(chunk)),
+                    "limit": len(chunk),
+                }
+            ):
+                self._stations_data.update(
+                    self._build_station_data(
+                        station, user_longitude=longitude, user_latitude=latitude
+                    )
+                )
+
+        added_ids = {
+            station_id
+            for station_id in self._stations_data
+            if str(station_id) in added_ids
+        }
+        if added_ids:
+            await self.update_stations_prices(dict.fromkeys(added_ids, self._fuels))
+        return added_ids, removed_ids
+
+    async def update_stations_prices(
+        self, stations_fuels: Mapping[str, Iterable[str]] | None = None
+    ) -> None:
+        """Update prices of specified station fuels, or of all known stations.
+
+        Only enabled fuels are requested, stations without any are skipped.
+        """
+        _LOGGER.debug("Call %s API to retrieve fuel prices", self._api_url)
+        fuels = list(self._fuels)
+        if not fuels:
+            _LOGGER.debug("No fuel enabled, skip prices update")
+            return
+        if stations_fuels is None:
+            stations_fuels = {station_id: fuels for station_id in self._stations_data}
+        for station_id, station_fuels in stations_fuels.items():
+            if (station_data := self._stations_data.get(station_id)) is None:
+                continue
+            for fuel in set(station_data[ATTR_FUELS]) - set(fuels):
+                del station_data[ATTR_FUELS][fuel]
+            if not (station_fuels := [f for f in fuels if f in station_fuels]):
+                continue
             _LOGGER.debug(
-                "Update fuel prices for station id %s: %s",
+                "Update %s prices for station id %s: %s",
+                station_fuels,
                 station_id,
                 station_data[ATTR_NAME],
             )
             response = await self._request_api(
                 {
-                    "select": query_select,
-                    "where": f"id={station_id}",
+                    "select": _query_select(fuels=station_fuels),
+                    "where": _query_where(_where_ids([station_id])),
                     "limit": 1,
                 }
             )
@@ -209,51 +501,164 @@ class PrixCarburantTool:
                     "%s stations returned, must be 1", response["total_count"]
                 )
                 continue
-            new_prices = response["results"][0]
-            for fuel in FUELS:
-                fuel_key = fuel.lower()
-                if new_prices[f"{fuel_key}_prix"]:
-                    station_data[ATTR_FUELS].update(
-                        {
-                            fuel: {
-                                ATTR_UPDATED_DATE: new_prices[f"{fuel_key}_maj"],
-                                ATTR_PRICE: new_prices[f"{fuel_key}_prix"],
-                            }
-                        }
-                    )
+            station_data[ATTR_FUELS].update(
+                _get_fuels_data(response["results"][0], station_fuels)
+            )
+
+    async def fetch_stations_in_area(
+        self, south: float, west: float, north: float, east: float
+    ) -> dict:
+        """Return stations of the area with the prices of all fuels."""
+        data = {}
+        query_where = _query_where(
+            f"in_bbox(geom, {south}, {west}, {north}, {east})", fuels=FUELS
+        )
+        response_count = await self._request_api(
+            {"select": "id", "where": query_where, "limit": 1}
+        )
+        stations_count = response_count["total_count"]
+        _LOGGER.debug("%s stations in area", stations_count)
+
+        for query_offset in range(0, stations_count, 100):
+            async for station in self._stream_api(
+                {
+                    "select": _query_select(STATION_FIELDS, fuels=FUELS),
+                    "where": query_where,
+                    "offset": query_offset,
+                    "limit": min(100, stations_count - query_offset),
+                }
+            ):
+                station_data = self._build_station_data(station)
+                for station_info in station_data.values():
+                    station_info[ATTR_FUELS].update(_get_fuels_data(station, FUELS))
+                data.update(station_data)
+        return data
 
     async def find_nearest_station(
-        self, longitude: float, latitude: float, fuel: str, distance: int = 10
+        self,
+        longitude: float,
+        latitude: float,
+        fuel: str,
+        distance: int = 10,
+        stations: dict | None = None,
+        ranking: str = RANKING_PRICE,
+        consumption: float = DEFAULT_CONSUMPTION,
+        tank_size: float = DEFAULT_TANK_SIZE,
+    ) -> dict:
+        """Return stations near the location where the fuel price is the lowest.
+
+        If stations with their fuels prices are given, they are ranked
+        locally instead of querying the API. With the effective cost
+        ranking, the cost of the round trip to the station, driven with
+        the consumption in L/100km, is added to the cost of the tank.
+        """
+        if stations is None and ranking == RANKING_PRICE:
+            return await self._query_nearest_stations(
+                longitude, latitude, fuel, distance, NEAREST_STATIONS_COUNT
+            )
+        if stations is None:
+            stations = await self._query_nearest_stations(
+                longitude, latitude, fuel, distance, NEAREST_STATIONS_CANDIDATES
+            )
+        return self._rank_nearest_stations(
+            stations,
+            longitude,
+            latitude,
+            fuel,
+            distance,
+            ranking,
+            consumption,
+            tank_size,
+        )
+
+    async def _query_nearest_stations(
+        self, longitude: float, latitude: float, fuel: str, distance: int, limit: int
     ) -> dict:
-        """Return stations near the location where the fuel price is the lowest."""
+        """Return stations near the location ordered by fuel price."""
         data = {}
         _LOGGER.debug(
             "Call %s API to retrieve nearest stations ordered by price",
-            PRIX_CARBURANT_API_URL,
+            self._api_url,
         )
         response = await self._request_api(
             {
-                "select": "id,latitude,longitude,cp,ad"
-                f"resse,ville,{fuel.lower()}_prix,{fuel.lower()}_maj",  # split string to avoid codespell french word
-                "where": f"distance(geom, geom'POINT({longitude} {latitude})', {distance}km)",
+                "select": _query_select(STATION_FIELDS, fuels=[fuel]),
+                "where": _query_where(
+                    _where_distance(longitude, latitude, distance), fuels=[fuel]
+                ),
                 "order_by": f"{fuel.lower()}_prix",
-                "limit": 10,
+                "limit": limit,
             }
         )
         stations_count = response["total_count"]
         _LOGGER.debug("%s stations returned by the API", stations_count)
 
         for station in response["results"]:
-            data.update(
-                self._build_station_data(
-                    station,
-                    user_longitude=longitude,
-                    user_latitude=latitude,
-                    fuel_key=f"{fuel.lower()}_prix",
-                )
+            station_data = self._build_station_data(
+                station,
+                user_longitude=longitude,
+                user_latitude=latitude,
+                fuel_key=f"{fuel.lower()}_prix",
             )
+            for station_info in station_data.values():
+                station_info[ATTR_FUELS].update(_get_fuels_data(station, [fuel]))
+            data.update(station_data)
         return data
 
+    def _rank_nearest_stations(
+        self,
+        stations: dict,
+        longitude: float,
+        latitude: float,
+        fuel: str,
+        distance: int,
+        ranking: str,
+        consumption: float,
+        tank_size: float,
+    ) -> dict:
+        """Return the best ranked stations within distance."""
+        candidates = [
+            (station_id, station_data, float(fuel_data[ATTR_PRICE]))
+            for station_id, station_data in stations.items()
+            if (fuel_data := station_data[ATTR_FUELS].get(fuel))
+        ]
+        distances = get_distances(
+            longitude,
+            latitude,
+            [
+                (station_data[ATTR_LONGITUDE], station_data[ATTR_LATITUDE])
+                for _, station_data, _ in candidates
+            ],
+        )
+
+        ranked = []
+        for (station_id, station_data, price), station_distance in zip(
+            candidates, distances, strict=True
+        ):
+            if station_distance > distance:
+                continue
+            # fuel used for the round trip to the station
+            detour = 2 * station_distance * consumption / 100
+            effective_cost = round(price * (tank_size + detour), 2)
+            ranked.append(
+                (
+                    effective_cost if ranking == RANKING_EFFECTIVE_COST else price,
+                    station_id,
+                    station_data
+                    | {
+                        ATTR_DISTANCE: station_distance,
+                        ATTR_PRICE: price,
+                        ATTR_EFFECTIVE_COST: effective_cost,
+                    },
+                )
+            )
+        ranked.sort(key=lambda item: item[0])
+
+        return {
+            station_id: station_data
+            for _, station_id, station_data in ranked[:NEAREST_STATIONS_COUNT]
+        }
+
     def _build_station_data(
         self,
         station: dict,
@@ -266,7 +671,7 @@ class PrixCarburantTool:
             latitude = float(station["latitude"]) / 100000
             longitude = float(station["longitude"]) / 100000
             distance = (
-                _get_distance(longitude, latitude, user_longitude, user_latitude)
+                get_distance(longitude, latitude, user_longitude, user_latitude)
                 if user_longitude and user_latitude
                 else None
             )
@@ -313,19 +718,146 @@ class PrixCarburantTool:
         return data
 
 
-def _get_distance(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
-    """Get distance from 2 locations."""
+def _get_fuels_data(station: dict, fuels: Iterable[str]) -> dict:
+    """Return price and update date of fuels sold by the station."""
+    data = {}
+    for fuel in fuels:
+        fuel_key = fuel.lower()
+        if station.get(f"{fuel_key}_prix"):
+            data[fuel] = {
+                ATTR_UPDATED_DATE: station[f"{fuel_key}_maj"],
+                ATTR_PRICE: station[f"{fuel_key}_prix"],
+            }
+    return data
+
+
+def _create_session(stats: PrixCarburantTransportStats) -> ClientSession:
+    """Create a session with a bounded keep-alive pool and DNS cache."""
+
+    async def on_connection_create_end(*_: Any) -> None:
+        stats.connections_created += 1
+
+    async def on_connection_reuseconn(*_: Any) -> None:
+        stats.connections_reused += 1
+
+    async def on_dns_resolvehost_end(*_: Any) -> None:
+        stats.dns_resolutions += 1
+
+    async def on_dns_cache_hit(*_: Any) -> None:
+        stats.dns_cache_hits += 1
+
+    trace_config = TraceConfig()
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+
+    return ClientSession(
+        connector=TCPConnector(
+            ssl=client_context(),
+            limit=CONNECTION_POOL_SIZE,
+            limit_per_host=CONNECTION_POOL_SIZE,
+            use_dns_cache=True,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ),
+        trace_configs=[trace_config],
+    )
+
+
+class _RecordsParser:
+    """Incremental parser of the results array of an API response."""
+
+    def __init__(self) -> None:
+        """Init parser."""
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._in_results = False
+        self.done = False
+
+    def feed(self, chunk: bytes) -> list[dict]:
+        """Feed bytes and return the records completed by them."""
+        self._buffer += self._text_decoder.decode(chunk)
+        if not self._in_results:
+            if (match := RESULTS_START.search(self._buffer)) is None:
+                return []
+            self._buffer = self._buffer[match.end() :]
+            self._in_results = True
+
+        records = []
+        buffer = self._buffer
+        position = 0
+        while not self.done:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if buffer[position] == "]":
+                self.done = True
+                break
+            try:
+                record, position = self._decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # record not fully received yet
+                break
+            records.append(record)
+        self._buffer = buffer[position:]
+        return records
+
+
+def _query_select(fields: Iterable[str] = (), fuels: Iterable[str] = ()) -> str:
+    """Build the select clause, with price and update date of each fuel."""
+    fuels = [fuel.lower() for fuel in fuels]
+    return ",".join(
+        [*fields, *[f"{f}_prix" for f in fuels], *[f"{f}_maj" for f in fuels]]
+    )
+
+
+def _query_where(*conditions: str, fuels: Iterable[str] = ()) -> str:
+    """Build the where clause, filtering stations selling none of the fuels."""
+    clauses = [f"({condition})" for condition in conditions]
+    if fuel_filters := [f"{fuel.lower()}_prix is not null" for fuel in fuels]:
+        clauses.append(f"({' or '.join(fuel_filters)})")
+    return " and ".join(clauses)
+
+
+def _where_distance(longitude: float, latitude: float, distance: int) -> str:
+    """Return the condition matching stations within distance in km."""
+    return f"distance(geom, geom'POINT({longitude} {latitude})', {distance}km)"
+
+
+def _where_ids(station_ids: Iterable[str]) -> str:
+    """Return the condition matching the station IDs."""
+    return " or ".join(f"id={station_id}" for station_id in station_ids)
+
+
+def get_distances(
+    longitude: float, latitude: float, locations: list[tuple[float, float]]
+) -> list[float]:
+    """Get distances from a location to many (longitude, latitude) locations."""
     earth_radius = 6371
 
-    # convert decimal degrees to radians
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
+    # convert decimal degrees to radians, once for the origin
+    lon1, lat1 = radians(longitude), radians(latitude)
+    cos_lat1 = cos(lat1)
+
+    distances = []
+    for lon2, lat2 in locations:
+        lon2, lat2 = radians(lon2), radians(lat2)
+        # haversine formula
+        calcul_a = (
+            sin((lat2 - lat1) / 2) ** 2
+            + cos_lat1 * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+        )
+        calcul_c = 2 * atan2(sqrt(calcul_a), sqrt(1 - calcul_a))
+        distances.append(round(calcul_c * earth_radius, 2))
+    return distances
 
-    # haversine formula
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    calcul_a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    calcul_c = 2 * atan2(sqrt(calcul_a), sqrt(1 - calcul_a))
-    return round(calcul_c * earth_radius, 2)
+
+def get_distance(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Get distance from 2 locations."""
+    return get_distances(lon1, lat1, [(lon2, lat2)])[0]
 
 
 def get_entity_picture(brand: str) -> str:  # noqa: C901
@@ -403,6 +935,11 @@ def get_entity_picture(brand: str) -> str:  # noqa: C901
     return ""
 
 
+def get_enabled_fuels(config: Mapping[str, Any]) -> list[str]:
+    """Return fuels enabled in the configuration."""
+    return [fuel for fuel in FUELS if config.get(f"{CONF_FUELS}_{fuel}", True)]
+
+
 def normalize_string(string: str | None) -> str:
     """Normalize a string."""
     if string is None:
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""Scale simulation of the Prix Carburant sensor platform.
+
+Generate synthetic stations, serve them from a local stand-in of the
+Prix Carburant API running in a child process, then set up a config
+entry of the integration and drive state writes, refreshes, an options
+change and the unload, reporting wall time, CPU time, event loop
+blocking and memory of each phase.
+
+Requires Home Assistant in the Python environment, run it from the
+repository root:
+
+    PYTHONPATH=. python scripts/simulate_sensors.py --stations 500,5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import multiprocessing
+from multiprocessing.connection import Connection
+from pathlib import Path
+import random
+import re
+import resource
+import socket
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import MappingProxyType
+from typing import Any
+from unittest.mock import patch
+
+from aiohttp import web
+
+from homeassistant import bootstrap, loader
+from homeassistant.components.sensor import DOMAIN as SENSOR_DOMAIN
+from homeassistant.config_entries import (
+    SOURCE_USER,
+    ConfigEntries,
+    ConfigEntry,
+    ConfigEntryState,
+)
+from homeassistant.const import ATTR_RESTORED, CONF_SCAN_INTERVAL
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.prix_carburant import tools
+from custom_components.prix_carburant.const import (
+    ATTR_FUELS,
+    ATTR_PRICE,
+    ATTR_UPDATED_DATE,
+    CONF_DISPLAY_ENTITY_PICTURES,
+    CONF_FUELS,
+    CONF_MAX_KM,
+    DEFAULT_NAME,
+    DOMAIN,
+    FUELS,
+)
+from custom_components.prix_carburant.profiler import LoopBlockingMonitor
+
+_LOGGER = logging.getLogger("simulate_sensors")
+
+HOME_LATITUDE = 48.8566
+HOME_LONGITUDE = 2.3522
+DISTANCE = 15
+# above the IDs of stations_name.json, so synthetic stations get no real name
+FIRST_STATION_ID = 99000000
+
+
+class SimulationError(Exception):
+    """Exception to indicate the simulation did not behave as a real setup."""
+
+
+def generate_stations(count: int, fuel_probability: float, seed: int) -> list[dict]:
+    """Generate API records of synthetic stations around home."""
+    rand = random.Random(seed)
+    stations = []
+    for index in range(count):
+        station: dict[str, Any] = {
+            "id": FIRST_STATION_ID + index,
+            "latitude": str(int((HOME_LATITUDE + rand.uniform(-0.1, 0.1)) * 100000)),
+            "longitude": str(
+                int((HOME_LONGITUDE + rand.uniform(-0.15, 0.15)) * 100000)
+            ),
+            "cp": f"75{index % 20 + 1:03d}",
+            "ad" + "resse": f"{index} RUE DE LA SIMULATION",
+            "ville": rand.choice(["PARIS", "montreuil", "Vincennes"]),
+        }
+        for fuel in FUELS:
+            fuel_key = fuel.lower()
+            if rand.random() < fuel_probability:
+                station[f"{fuel_key}_prix"] = round(rand.uniform(1.6, 2.1), 3)
+                station[f"{fuel_key}_maj"] = "2026-10-19T08:00:00+02:00"
+            else:
+                station[f"{fuel_key}_prix"] = None
+                station[f"{fuel_key}_maj"] = None
+        stations.append(station)
+    return stations
+
+
+def update_prices(stations: list[dict], ratio: float, tick: int, seed: int) -> None:
+    """Change the price of a ratio of the stations fuels."""
+    rand = random.Random(seed + tick)
+    for station in stations:
+        for fuel in FUELS:
+            fuel_key = fuel.lower()
+            if station[f"{fuel_key}_prix"] and rand.random() < ratio:
+                station[f"{fuel_key}_prix"] = round(rand.uniform(1.6, 2.1), 3)
+                station[f"{fuel_key}_maj"] = (
+                    f"2026-10-19T{8 + tick % 12:02d}:{tick % 60:02d}:00+02:00"
+                )
+
+
+class ApiStandIn:
+    """Local stand-in of the records endpoint of the API."""
+
+    def __init__(self, stations: list[dict]) -> None:
+        """Init stand-in."""
+        self.stations = stations
+        self.requests = 0
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+    async def start(self) -> None:
+        """Start the HTTP server on a free local port."""
+        app = web.Application()
+        app.router.add_get("/records", self._handle_records)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        await web.SockSite(self._runner, sock).start()
+        self.url = f"http://127.0.0.1:{sock.getsockname()[1]}/records"
+
+    async def stop(self) -> None:
+        """Stop the HTTP server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle_records(self, request: web.Request) -> web.Response:
+        """Answer a records query, supporting the clauses used by the tool."""
+        self.requests += 1
+        where = request.query.get("where", "")
+        results = self.stations
+        if station_ids := {int(i) for i in re.findall(r"\bid=(\d+)", where)}:
+            results = [s for s in results if s["id"] in station_ids]
+        if fuel_keys := re.findall(r"(\w+)_prix is not null", where):
+            results = [
+                s for s in results if any(s[f"{key}_prix"] for key in fuel_keys)
+            ]
+        if order_by := request.query.get("order_by"):
+            results = sorted(results, key=lambda s: s.get(order_by) or 99)
+
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query.get("limit", 10))
+        fields = request.query.get("select", "").split(",")
+        return web.json_response(
+            {
+                "total_count": len(results),
+                "results": [
+                    {field: station.get(field) for field in fields}
+                    for station in results[offset : offset + limit]
+                ],
+            }
+        )
+
+
+def _serve_api(
+    size: int, fuel_probability: float, seed: int, connection: Connection
+) -> None:
+    """Serve the API stand-in until asked to stop, in a child process."""
+    asyncio.run(_async_serve_api(size, fuel_probability, seed, connection))
+
+
+async def _async_serve_api(
+    size: int, fuel_probability: float, seed: int, connection: Connection
+) -> None:
+    """Serve the API stand-in and apply price updates sent by the parent."""
+    loop = asyncio.get_running_loop()
+    api = ApiStandIn(generate_stations(size, fuel_probability, seed))
+    await api.start()
+    connection.send(api.url)
+    while (message := await loop.run_in_executor(None, connection.recv)) is not None:
+        update_prices(api.stations, *message)
+        connection.send(None)
+    await api.stop()
+    connection.send(api.requests)
+
+
+class ApiStandInProcess:
+    """API stand-in in a child process, out of the measured CPU time and memory."""
+
+    def __init__(self, size: int, fuel_probability: float, seed: int) -> None:
+        """Init process."""
+        context = multiprocessing.get_context("spawn")
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(
+            target=_serve_api,
+            args=(size, fuel_probability, seed, child_connection),
+            daemon=True,
+        )
+        self.url = ""
+
+    async def async_start(self) -> None:
+        """Start the process and wait for the server URL."""
+        self._process.start()
+        self.url = await asyncio.to_thread(self._connection.recv)
+
+    async def async_update_prices(self, ratio: float, tick: int, seed: int) -> None:
+        """Change prices served by the stand-in."""
+        self._connection.send((ratio, tick, seed))
+        await asyncio.to_thread(self._connection.recv)
+
+    async def async_stop(self) -> int:
+        """Stop the process and return the number of API requests served."""
+        self._connection.send(None)
+        requests = await asyncio.to_thread(self._connection.recv)
+        await asyncio.to_thread(self._process.join)
+        return requests
+
+
+class ErrorsRecorder(logging.Handler):
+    """Record messages of errors logged during a simulation."""
+
+    def __init__(self) -> None:
+        """Init recorder."""
+        super().__init__(logging.ERROR)
+        self.messages: list[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Record the message of an error."""
+        self.messages.append(f"{record.name}: {record.getMessage()}")
+
+
+class PhaseRecorder:
+    """Record wall time, CPU time, loop blocking and memory of phases."""
+
+    def __init__(self, hass: HomeAssistant, trace_memory: bool) -> None:
+        """Init recorder."""
+        self._hass = hass
+        self._trace_memory = trace_memory
+        self.phases: list[dict[str, Any]] = []
+
+    async def run(self, name: str, coro: Any) -> Any:
+        """Run a coroutine as a measured phase."""
+        monitor = LoopBlockingMonitor(self._hass.loop)
+        if self._trace_memory:
+            tracemalloc.start()
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        monitor.start()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            result = await coro
+            await self._hass.async_block_till_done()
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            monitor.stop()
+        phase = {
+            "phase": name,
+            "wall": round(wall, 3),
+            "cpu": round(cpu, 3),
+            "loop_blocking_max": round(max(monitor.blockings, default=0), 3),
+            "loop_blocking_total": round(sum(monitor.blockings), 3),
+            "max_rss_growth_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            - max_rss,
+        }
+        if self._trace_memory:
+            phase["traced_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+        self.phases.append(phase)
+        return result
+
+
+async def async_start_hass(config_dir: str) -> HomeAssistant:
+    """Start Home Assistant with the helpers a config entry setup needs."""
+    hass = HomeAssistant(config_dir)
+    hass.config.latitude = HOME_LATITUDE
+    hass.config.longitude = HOME_LONGITUDE
+    hass.config.skip_pip = True
+    loader.async_setup(hass)
+    hass.config_entries = ConfigEntries(hass, {})
+    # registries, restore state of sensors and config entries
+    await bootstrap.async_load_base_functionality(hass)
+    return hass
+
+
+def create_config_entry() -> ConfigEntry:
+    """Create a config entry as the user step of the config flow does."""
+    kwargs: dict[str, Any] = {
+        "version": 1,
+        "minor_version": 1,
+        "domain": DOMAIN,
+        "title": DEFAULT_NAME,
+        "data": {
+            CONF_MAX_KM: DISTANCE,
+            CONF_DISPLAY_ENTITY_PICTURES: True,
+            CONF_SCAN_INTERVAL: 4,
+        }
+        | {f"{CONF_FUELS}_{fuel}": True for fuel in FUELS},
+        "options": {},
+        "source": SOURCE_USER,
+        "unique_id": None,
+    }
+    # arguments required by newer releases
+    parameters = inspect.signature(ConfigEntry).parameters
+    if "discovery_keys" in parameters:
+        kwargs["discovery_keys"] = MappingProxyType({})
+    if "subentries_data" in parameters:
+        kwargs["subentries_data"] = None
+    return ConfigEntry(**kwargs)
+
+
+def check_sensors(
+    hass: HomeAssistant, entry: ConfigEntry, stations: dict, fuels: list[str]
+) -> int:
+    """Return the number of sensors in hass, raise if any is missing."""
+    expected = sum(
+        1
+        for station_data in stations.values()
+        for fuel in fuels
+        if fuel in station_data[ATTR_FUELS]
+    )
+    added = 0
+    for registry_entry in er.async_entries_for_config_entry(
+        er.async_get(hass), entry.entry_id
+    ):
+        # removed sensors keep their registry entry and a restored state
+        state = hass.states.get(registry_entry.entity_id)
+        if (
+            registry_entry.domain == SENSOR_DOMAIN
+            and state is not None
+            and not state.attributes.get(ATTR_RESTORED)
+        ):
+            added += 1
+    if added != expected:
+        raise SimulationError(f"{added} of {expected} sensors added to hass")
+    return added
+
+
+async def simulate(size: int, args: argparse.Namespace) -> dict[str, Any]:
+    """Run the simulation for a number of stations."""
+    api = ApiStandInProcess(size, args.fuel_probability, args.seed)
+    await api.async_start()
+    errors = ErrorsRecorder()
+    logging.getLogger().addHandler(errors)
+
+    try:
+        with (
+            tempfile.TemporaryDirectory() as config_dir,
+            patch.object(tools, "PRIX_CARBURANT_API_URL", api.url),
+        ):
+            hass = await async_start_hass(config_dir)
+            recorder = PhaseRecorder(hass, args.trace_memory)
+            entry = create_config_entry()
+
+            await recorder.run("setup entry", hass.config_entries.async_add(entry))
+            if entry.state is not ConfigEntryState.LOADED:
+                raise SimulationError(f"Config entry setup failed: {entry.state}")
+            data = hass.data[DOMAIN][entry.entry_id]
+            tool: tools.PrixCarburantTool = data["tool"]
+            coordinator = data["coordinator"]
+            sensors = check_sensors(
+                hass, entry, tool.stations, data["options"][CONF_FUELS]
+            )
+
+            for tick in range(args.ticks):
+
+                async def async_tick(tick: int = tick) -> None:
+                    # change prices in place, without network
+                    rand = random.Random(args.seed + tick)
+                    for station_data in tool.stations.values():
+                        for fuel_data in station_data[ATTR_FUELS].values():
+                            if rand.random() < args.change_ratio:
+                                fuel_data[ATTR_PRICE] = round(rand.uniform(1.6, 2.1), 3)
+                                fuel_data[ATTR_UPDATED_DATE] = (
+                                    f"2026-10-19T{8 + tick % 12:02d}:00:00+02:00"
+                                )
+                    data["history"].async_record(tool.stations)
+                    coordinator.async_set_updated_data(tool.stations)
+
+                await recorder.run(f"state writes {tick + 1}", async_tick())
+
+            for refresh in range(args.refreshes):
+                await api.async_update_prices(
+                    args.change_ratio, refresh + 1, args.seed
+                )
+                await recorder.run(
+                    f"refresh {refresh + 1}", coordinator.async_refresh()
+                )
+
+            # removes the sensors and devices of the fuel through the listener
+            fuel = FUELS[-1]
+
+            async def async_disable_fuel() -> None:
+                hass.config_entries.async_update_entry(
+                    entry, options={f"{CONF_FUELS}_{fuel}": False}
+                )
+
+            await recorder.run(f"disable {fuel}", async_disable_fuel())
+            check_sensors(hass, entry, tool.stations, data["options"][CONF_FUELS])
+
+            await recorder.run(
+                "unload entry", hass.config_entries.async_unload(entry.entry_id)
+            )
+            await hass.async_stop(force=True)
+    finally:
+        logging.getLogger().removeHandler(errors)
+        api_requests = await api.async_stop()
+
+    if errors.messages:
+        raise SimulationError(
+            f"{len(errors.messages)} errors logged, first one: {errors.messages[0]}"
+        )
+    return {
+        "stations": len(tool.stations),
+        "sensors": sensors,
+        "api_requests": api_requests,
+        "transport": tool.transport_stats.as_dict(),
+        "phases": recorder.phases,
+    }
+
+
+def print_report(size: int, report: dict[str, Any]) -> None:
+    """Print the report of a simulation."""
+    print(
+        f"\n{size} stations generated, {report['stations']} discovered, "
+        f"{report['sensors']} sensors, {report['api_requests']} API requests"
+    )
+    columns = list(report["phases"][0])
+    widths = [
+        max(len(column), *(len(str(phase[column])) for phase in report["phases"]))
+        for column in columns
+    ]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths, strict=True)))
+    for phase in report["phases"]:
+        print(
+            "  ".join(
+                str(phase[c]).ljust(w) for c, w in zip(columns, widths, strict=True)
+            )
+        )
+
+
+def main() -> None:
+    """Parse arguments and run simulations."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--stations",
+        default="500,5000",
+        help="comma separated numbers of generated stations",
+    )
+    parser.add_argument("--fuel-probability", type=float, default=0.6)
+    parser.add_argument("--change-ratio", type=float, default=0.1)
+    parser.add_argument("--ticks", type=int, default=3, help="state writes cycles")
+    parser.add_argument("--refreshes", type=int, default=1, help="full refreshes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="trace allocations peak of each phase (slows the phases down)",
+    )
+    parser.add_argument("--json", type=Path, help="write the reports to a file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    reports = {}
+    for size in (int(size) for size in args.stations.split(",")):
+        try:
+            reports[size] = asyncio.run(simulate(size, args))
+        except SimulationError as err:
+            sys.exit(f"Simulation of {size} stations failed: {err}")
+        print_report(size, reports[size])
+
+    if args.json:
+        args.json.write_text(json.dumps(reports, indent=2), encoding="UTF-8")
+
+
+if __name__ == "__main__":
+    main()